@@ -6,3 +6,9 @@ from .point_cloud2 import *
 from .image import *
 from .navigation import *
 from .geometry import *
+from .recording import *
+from .tf2 import *
+from .camera import *
+from .synchronizer import *
+from .payload import *
+from . import instrumentation
@@ -0,0 +1,127 @@
+import functools
+import numpy as np
+import cv2
+from . import instrumentation
+
+
+def camerainfo_to_numpy(msg):
+    """
+    Convert a ROS CameraInfo message to a dict of numpy arrays: K (3, 3), D (n,), R (3, 3), P (3, 4), along with the
+    width, height and distortion_model. Both the ROS2 (k, d, r, p) and ROS1 (K, D, R, P) field names are accepted.
+    :param msg:
+    :return: dict
+    """
+    def field(name):
+        return msg[name.lower()] if name.lower() in msg else msg[name]
+
+    return dict(
+        K=np.asarray(field('K'), dtype=np.float64).reshape(3, 3),
+        D=np.asarray(field('D'), dtype=np.float64).ravel(),
+        R=np.asarray(field('R'), dtype=np.float64).reshape(3, 3),
+        P=np.asarray(field('P'), dtype=np.float64).reshape(3, 4),
+        width=int(msg['width']),
+        height=int(msg['height']),
+        distortion_model=msg.get('distortion_model', 'plumb_bob')
+    )
+
+
+def _as_camera_info(camera_info):
+    if isinstance(camera_info.get('K'), np.ndarray):
+        return camera_info
+    return camerainfo_to_numpy(camera_info)
+
+
+@functools.lru_cache(maxsize=16)
+def _ray_grid(k, d, distortion_model, width, height, step):
+    """Return the (rows, cols, 2) float32 x/z, y/z ray grid of the pixels sampled every step pixels. Cached per
+    camera so only the first frame pays for the unprojection.
+    """
+    v, u = np.mgrid[0:height:step, 0:width:step].astype(np.float64)
+    K = np.array(k).reshape(3, 3)
+    D = np.array(d)
+    if D.size and np.any(D != 0):
+        pixels = np.stack([u.ravel(), v.ravel()], axis=1).reshape(-1, 1, 2)
+        if distortion_model == 'equidistant':
+            rays = cv2.fisheye.undistortPoints(pixels, K, D[:4])
+        else:
+            rays = cv2.undistortPoints(pixels, K, D)
+        rays = rays.reshape(u.shape + (2,))
+    else:
+        rays = np.empty(u.shape + (2,))
+        rays[..., 0] = (u - K[0, 2]) / K[0, 0]
+        rays[..., 1] = (v - K[1, 2]) / K[1, 1]
+    rays = rays.astype(np.float32)
+    rays.flags.writeable = False
+    return rays
+
+
+def depth_ray_grid(camera_info, step=1):
+    """Return the cached (rows, cols, 2) unprojection grid of a camera: multiplying it by the depth of every pixel
+    gives the x and y of the point in the optical frame.
+    """
+    camera_info = _as_camera_info(camera_info)
+    return _ray_grid(tuple(camera_info['K'].ravel()), tuple(camera_info['D']), camera_info['distortion_model'],
+                     camera_info['width'], camera_info['height'], step)
+
+
+@instrumentation.instrumented
+def depth_image_to_array(depth, camera_info, depth_scale=None, min_depth=0.0, max_depth=np.inf, step=1,
+                         rgb=None, organized=False):
+    """Project a depth image from raw_image_to_numpy into a point cloud record array that array_to_pointcloud2
+    accepts as is.
+
+    :param depth: (height, width) 16UC1 (millimetres) or 32FC1 (metres) depth image
+    :param camera_info: CameraInfo message or the output of camerainfo_to_numpy
+    :param depth_scale: metres per depth unit, by default 0.001 for integer and 1 for floating point images
+    :param min_depth: points closer than this (in metres) are dropped
+    :param max_depth: points further than this (in metres) are dropped
+    :param step: only project every step-th pixel in both directions
+    :param rgb: optional (height, width, 3) bgr8 image registered to the depth image, adds a packed 'rgb' field
+    :param organized: keep the (rows, cols) shape with NaN points instead of dropping invalid pixels
+    :return: record array with float32 fields x, y, z (and rgb)
+    """
+    camera_info = _as_camera_info(camera_info)
+    if depth.shape != (camera_info['height'], camera_info['width']):
+        raise TypeError('Depth image is {}, camera is {}x{}'.format(
+            depth.shape, camera_info['height'], camera_info['width']))
+    if depth_scale is None:
+        depth_scale = 0.001 if np.issubdtype(depth.dtype, np.integer) else 1.0
+
+    with instrumentation.stage('rays'):
+        rays = depth_ray_grid(camera_info, step)
+
+    with instrumentation.stage('filter'):
+        z = depth[::step, ::step].astype(np.float32)
+        if depth_scale != 1.0:
+            z *= np.float32(depth_scale)
+        # NaN compares false, so non finite depths are dropped too
+        valid = (z > max(min_depth, 0.0)) & (z <= max_depth)
+
+    fields = [('x', np.float32), ('y', np.float32), ('z', np.float32)]
+    if rgb is not None:
+        fields.append(('rgb', np.float32))
+
+    with instrumentation.stage('fill'):
+        if organized:
+            cloud = np.empty(z.shape, dtype=fields)
+            z[~valid] = np.nan
+            np.multiply(rays[..., 0], z, out=cloud['x'])
+            np.multiply(rays[..., 1], z, out=cloud['y'])
+            cloud['z'] = z
+        else:
+            z = z[valid]
+            cloud = np.empty(z.shape, dtype=fields)
+            np.multiply(rays[..., 0][valid], z, out=cloud['x'])
+            np.multiply(rays[..., 1][valid], z, out=cloud['y'])
+            cloud['z'] = z
+        instrumentation.record_copy(cloud.nbytes)
+
+        if rgb is not None:
+            colors = rgb[::step, ::step]
+            if not organized:
+                colors = colors[valid]
+            packed = (colors[..., 2].astype(np.uint32) << 16) | (colors[..., 1].astype(np.uint32) << 8) | \
+                colors[..., 0].astype(np.uint32)
+            # same packing as merge_rgb_fields
+            cloud['rgb'] = packed.view(np.float32)
+    return cloud
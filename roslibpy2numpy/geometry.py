@@ -1,8 +1,10 @@
 import transformations as transformations
 import numpy as np
 import roslibpy
+from . import instrumentation
 
 
+@instrumentation.instrumented
 def vector3_to_numpy(msg, hom=False):
     if hom:
         return np.array([msg['x'], msg['y'], msg['z'], 0])
@@ -10,6 +12,7 @@ def vector3_to_numpy(msg, hom=False):
         return np.array([msg['x'], msg['y'], msg['z']])
 
 
+@instrumentation.instrumented
 def numpy_to_vector3(arr):
     if arr.dtype != np.float64:
         raise ValueError("Expected a floating point array")
@@ -24,6 +27,7 @@ def numpy_to_vector3(arr):
     return msg
 
 
+@instrumentation.instrumented
 def point_to_numpy(msg, hom=False):
     if hom:
         return np.array([msg['x'], msg['y'], msg['z'], 1])
@@ -31,6 +35,7 @@ def point_to_numpy(msg, hom=False):
         return np.array([msg['x'], msg['y'], msg['z']]).reshape(3, 1)
 
 
+@instrumentation.instrumented
 def numpy_to_point(arr):
     if arr.dtype != np.float64:
         raise ValueError("Expected a floating point array")
@@ -45,10 +50,12 @@ def numpy_to_point(arr):
     return msg
 
 
+@instrumentation.instrumented
 def quat_to_numpy(msg):
     return np.array([msg['x'], msg['y'], msg['z'], msg['w']])
 
 
+@instrumentation.instrumented
 def numpy_to_quat(arr):
     if arr.dtype != np.float64:
         raise ValueError("Expected a floating point array")
@@ -64,6 +71,7 @@ def numpy_to_quat(arr):
     return msg
 
 
+@instrumentation.instrumented
 def transform_to_numpy(msg):
     trans = np.array(transformations.translation_matrix(
         [msg['translation']['x'], msg['translation']['y'], msg['translation']['z']]))
@@ -72,6 +80,7 @@ def transform_to_numpy(msg):
     return np.dot(trans, rot)
 
 
+@instrumentation.instrumented
 def numpy_to_transform(arr):
     if arr.dtype != np.float64:
         raise ValueError("Expected a floating point array")
@@ -96,6 +105,7 @@ def numpy_to_transform(arr):
     return msg
 
 
+@instrumentation.instrumented
 def pose_to_numpy(msg):
     return np.dot(
         transformations.translation_matrix([msg['position']['x'], msg['position']['y'], msg['position']['z']]),
@@ -104,6 +114,7 @@ def pose_to_numpy(msg):
     )
 
 
+@instrumentation.instrumented
 def numpy_to_pose(arr):
     if arr.dtype != np.float64:
         raise ValueError("Expected a floating point array")
@@ -126,3 +137,18 @@ def numpy_to_pose(arr):
         }
     })
     return msg
+
+
+def header_stamp_to_sec(stamp):
+    """Convert a header stamp to seconds as a float.
+
+    Accepts ROS2 ({'sec', 'nanosec'}) and ROS1 ({'secs', 'nsecs'}) stamp dicts, as well as plain numbers such as the
+    time.time() stamps written by the numpy_to_* functions.
+    :param stamp:
+    :return: float seconds
+    """
+    if isinstance(stamp, dict):
+        if 'sec' in stamp:
+            return stamp['sec'] + stamp.get('nanosec', 0) * 1e-9
+        return stamp['secs'] + stamp.get('nsecs', 0) * 1e-9
+    return float(stamp)
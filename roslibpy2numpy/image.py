@@ -1,8 +1,9 @@
-import base64
 import sys
 import numpy as np
 import roslibpy
 import cv2
+from . import instrumentation
+from .payload import is_binary_payload, decode_payload, encode_payload
 
 name_to_dtypes = {
     "rgb8": (np.uint8, 3),
@@ -59,6 +60,7 @@ name_to_dtypes = {
 
 
 # noinspection PyArgumentList
+@instrumentation.instrumented
 def raw_image_to_numpy(msg):
     if not msg['encoding'] in name_to_dtypes:
         raise TypeError('Unrecognized encoding {}'.format(msg.encoding))
@@ -68,19 +70,34 @@ def raw_image_to_numpy(msg):
     dtype = dtype.newbyteorder('>' if msg['is_bigendian'] else '<')
     shape = (msg['height'], msg['width'], channels)
 
-    base64_bytes = msg['data'].encode('ascii')
-    image_bytes = base64.b64decode(base64_bytes)
+    # raw bytes (cbor transports) are used in place, base64 strings (json transport) are decoded
+    with instrumentation.stage('payload'):
+        image_bytes = decode_payload(msg['data'])
+    if not is_binary_payload(msg['data']):
+        instrumentation.record_copy(len(image_bytes))
     # # Convert to a NumPy array
-    data = np.frombuffer(image_bytes, dtype=dtype).reshape(shape)
+    with instrumentation.stage('frombuffer'):
+        data = np.frombuffer(image_bytes, dtype=dtype).reshape(shape)
     if msg['encoding'] == 'rgb8':
-        data = cv2.cvtColor(data, cv2.COLOR_RGB2BGR)
+        with instrumentation.stage('cvtColor'):
+            data = cv2.cvtColor(data, cv2.COLOR_RGB2BGR)
+        instrumentation.record_copy(data.nbytes)
 
     if channels == 1:
         data = data[..., 0]
     return data
 
 
-def numpy_to_image_raw(arr, encoding="bgr8", frame_id='camera_frame'):
+@instrumentation.instrumented
+def numpy_to_image_raw(arr, encoding="bgr8", frame_id='camera_frame', as_bytes=False):
+    """
+    Convert a numpy array to a ROS Image message.
+    :param arr:
+    :param encoding:
+    :param frame_id:
+    :param as_bytes: put the raw bytes in 'data' instead of a base64 string, for the cbor transports
+    :return:
+    """
     if encoding not in name_to_dtypes:
         raise TypeError('Unrecognized encoding {}'.format(encoding))
 
@@ -104,37 +121,59 @@ def numpy_to_image_raw(arr, encoding="bgr8", frame_id='camera_frame'):
         ))
 
     # make the array contiguous in memory, as mostly required by the format
-    contig = np.ascontiguousarray(arr)
-    data = contig.tostring()
+    with instrumentation.stage('contiguous'):
+        contig = np.ascontiguousarray(arr)
+        if contig is not arr:
+            instrumentation.record_copy(contig.nbytes)
     step = contig.strides[0]
 
-    im = roslibpy.Message({
-        'header': {
-            'frame_id': frame_id
-        },
-        'height': height,
-        'width': width,
-        'encoding': encoding,
-        # 'is_bigendian': is_bigendian,
-        'step': step,
-        'data': base64.b64encode(data).decode('ascii')
-    })
+    with instrumentation.stage('payload'):
+        encoded = encode_payload(contig, as_bytes)
+    instrumentation.record_copy(len(encoded))
+
+    with instrumentation.stage('message'):
+        im = roslibpy.Message({
+            'header': {
+                'frame_id': frame_id
+            },
+            'height': height,
+            'width': width,
+            'encoding': encoding,
+            # 'is_bigendian': is_bigendian,
+            'step': step,
+            'data': encoded
+        })
 
     return im
 
 
+@instrumentation.instrumented
 def compressed_image_to_numpy(img):
-    base64_bytes = img['data'].encode('ascii')
-    image_bytes = base64.b64decode(base64_bytes)
+    with instrumentation.stage('payload'):
+        image_bytes = decode_payload(img['data'])
+    if not is_binary_payload(img['data']):
+        instrumentation.record_copy(len(image_bytes))
     # Convert the image to a numpy array
     np_arr = np.frombuffer(image_bytes, dtype=np.uint8)
     # Decode the numpy array as an image
-    img_np = cv2.imdecode(np_arr, cv2.IMREAD_COLOR)
+    with instrumentation.stage('imdecode'):
+        img_np = cv2.imdecode(np_arr, cv2.IMREAD_COLOR)
     return img_np
 
 
-def numpy_to_compressed_image(arr, frame_id='camera_frame', encoding='jpeg'):
+@instrumentation.instrumented
+def numpy_to_compressed_image(arr, frame_id='camera_frame', encoding='jpeg', as_bytes=False):
+    """
+    Convert an encoded image buffer (e.g. from cv2.imencode) to a ROS CompressedImage message.
+    :param arr:
+    :param frame_id:
+    :param encoding:
+    :param as_bytes: put the raw bytes in 'data' instead of a base64 string, for the cbor transports
+    :return:
+    """
     if encoding not in ['jpeg', 'png']:
         raise TypeError('Unrecognized encoding {}'.format(encoding))
-    encoded = base64.b64encode(arr).decode('ascii')
+    with instrumentation.stage('payload'):
+        encoded = encode_payload(np.ascontiguousarray(arr), as_bytes)
+    instrumentation.record_copy(len(encoded))
     return dict(header=dict(frame_id=frame_id), format=encoding, data=encoded)
@@ -0,0 +1,241 @@
+"""
+Opt-in instrumentation of the converters: call counts, per-stage wall time histograms, input/output byte counts and
+copies made per call.
+
+Instrumentation is off by default. While disabled, every instrumented converter pays a single flag check and every
+stage a function call returning a shared no-op context manager.
+"""
+
+import time
+import bisect
+import functools
+import threading
+from collections.abc import Mapping
+import numpy as np
+
+# upper bounds in seconds of the wall time histogram buckets, the last bucket is +Inf
+BUCKETS = (1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4, 1e-3, 2.5e-3, 5e-3, 1e-2, 2.5e-2, 5e-2, 0.1, 0.25, 0.5, 1.0)
+
+# name of the stage covering the whole converter call
+TOTAL_STAGE = 'total'
+
+METRIC_PREFIX = 'roslibpy2numpy'
+
+_enabled = False
+_lock = threading.Lock()
+_local = threading.local()
+_stats = {}
+
+
+class _Histogram:
+    def __init__(self):
+        self.count = 0
+        self.sum = 0.0
+        self.buckets = [0] * (len(BUCKETS) + 1)
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        self.buckets[bisect.bisect_left(BUCKETS, value)] += 1
+
+    def to_dict(self):
+        return dict(count=self.count, sum=self.sum, buckets=list(self.buckets))
+
+
+class _ConverterStats:
+    def __init__(self):
+        self.calls = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.copies = 0
+        self.bytes_copied = 0
+        self.stages = {}
+
+    def observe(self, stage_name, seconds):
+        if stage_name not in self.stages:
+            self.stages[stage_name] = _Histogram()
+        self.stages[stage_name].observe(seconds)
+
+    def to_dict(self):
+        return dict(calls=self.calls, bytes_in=self.bytes_in, bytes_out=self.bytes_out, copies=self.copies,
+                    bytes_copied=self.bytes_copied,
+                    stages={name: hist.to_dict() for name, hist in self.stages.items()})
+
+
+class _NullStage:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+class _Stage:
+    def __init__(self, converter, name):
+        self.converter = converter
+        self.name = name
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.start
+        with _lock:
+            _get_stats(self.converter).observe(self.name, elapsed)
+        return False
+
+
+def _get_stats(converter):
+    if converter not in _stats:
+        _stats[converter] = _ConverterStats()
+    return _stats[converter]
+
+
+def _current_converter():
+    stack = getattr(_local, 'stack', None)
+    return stack[-1] if stack else None
+
+
+def payload_nbytes(obj):
+    """Best effort size in bytes of a converter input or output: arrays, bytes-like and base64 strings, messages
+    carrying a 'data' field and dicts of arrays.
+    """
+    if isinstance(obj, np.ndarray):
+        return obj.nbytes
+    if isinstance(obj, (bytes, bytearray, str)):
+        return len(obj)
+    if isinstance(obj, memoryview):
+        return obj.nbytes
+    if isinstance(obj, Mapping):
+        if 'data' in obj:
+            return payload_nbytes(obj['data'])
+        return sum(payload_nbytes(value) for value in obj.values() if isinstance(value, np.ndarray))
+    if hasattr(obj, 'itemsize') and hasattr(obj, '__len__'):
+        # array.array
+        return obj.itemsize * len(obj)
+    return 0
+
+
+def enable():
+    global _enabled
+    _enabled = True
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+def is_enabled():
+    return _enabled
+
+
+def reset():
+    with _lock:
+        _stats.clear()
+
+
+def instrumented(func):
+    """Decorator recording calls, total wall time and input/output bytes of a converter while instrumentation is
+    enabled. The converter is keyed by its function name.
+    """
+    name = func.__name__
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not _enabled:
+            return func(*args, **kwargs)
+
+        if not hasattr(_local, 'stack'):
+            _local.stack = []
+        _local.stack.append(name)
+        start = time.perf_counter()
+        try:
+            result = func(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            _local.stack.pop()
+        bytes_in = payload_nbytes(args[0]) if args else 0
+        bytes_out = payload_nbytes(result)
+        with _lock:
+            stats = _get_stats(name)
+            stats.calls += 1
+            stats.bytes_in += bytes_in
+            stats.bytes_out += bytes_out
+            stats.observe(TOTAL_STAGE, elapsed)
+        return result
+
+    return wrapper
+
+
+def stage(name):
+    """Context manager timing one stage of the converter currently running, e.g. ``with stage('payload'):``.
+    """
+    if not _enabled:
+        return _NULL_STAGE
+    converter = _current_converter()
+    if converter is None:
+        return _NULL_STAGE
+    return _Stage(converter, name)
+
+
+def record_copy(nbytes):
+    """Count a copy of nbytes made by the converter currently running.
+    """
+    if not _enabled:
+        return
+    converter = _current_converter()
+    if converter is None:
+        return
+    with _lock:
+        stats = _get_stats(converter)
+        stats.copies += 1
+        stats.bytes_copied += nbytes
+
+
+def snapshot():
+    """Return the collected metrics as a dict keyed by converter name.
+
+    Every converter maps to its calls, bytes_in, bytes_out, copies and bytes_copied counters and a 'stages' dict of
+    wall time histograms with count, sum (seconds) and per-bucket (non-cumulative) counts matching BUCKETS + [+Inf].
+    """
+    with _lock:
+        return {name: stats.to_dict() for name, stats in _stats.items()}
+
+
+def prometheus_text():
+    """Return the collected metrics in the Prometheus text exposition format.
+    """
+    snap = snapshot()
+    lines = []
+    counters = [('calls', 'Number of converter calls'),
+                ('bytes_in', 'Bytes of converter input payloads'),
+                ('bytes_out', 'Bytes of converter output payloads'),
+                ('copies', 'Number of buffer copies made by converters'),
+                ('bytes_copied', 'Bytes copied by converters')]
+    for key, help_text in counters:
+        metric = '{}_{}_total'.format(METRIC_PREFIX, key)
+        lines.append('# HELP {} {}'.format(metric, help_text))
+        lines.append('# TYPE {} counter'.format(metric))
+        for converter, stats in snap.items():
+            lines.append('{}{{converter="{}"}} {}'.format(metric, converter, stats[key]))
+
+    metric = '{}_stage_seconds'.format(METRIC_PREFIX)
+    lines.append('# HELP {} Wall time spent in converter stages'.format(metric))
+    lines.append('# TYPE {} histogram'.format(metric))
+    for converter, stats in snap.items():
+        for stage_name, hist in stats['stages'].items():
+            labels = 'converter="{}",stage="{}"'.format(converter, stage_name)
+            cumulative = 0
+            for bound, count in zip(BUCKETS + (float('inf'),), hist['buckets']):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append('{}_bucket{{{},le="{}"}} {}'.format(metric, labels, le, cumulative))
+            lines.append('{}_sum{{{}}} {}'.format(metric, labels, hist['sum']))
+            lines.append('{}_count{{{}}} {}'.format(metric, labels, hist['count']))
+    return '\n'.join(lines) + '\n'
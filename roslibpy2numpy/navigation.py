@@ -2,8 +2,12 @@ import time
 from array import array as Array
 import numpy as np
 import roslibpy
+import cv2
+from . import instrumentation
+from .payload import is_binary_payload
 
 
+@instrumentation.instrumented
 def odometry_to_numpy(msg):
     return dict(position=(np.array([
         msg['pose']['pose']['position']['x'],
@@ -29,6 +33,7 @@ def odometry_to_numpy(msg):
     ])))
 
 
+@instrumentation.instrumented
 def numpy_to_odometry(msg, frame_id="odom", child_frame_id="base_footprint"):
     """
     Convert a numpy array to a ROS Odometry message. The array must be of shape (13,) and must be in the following order:
@@ -76,14 +81,15 @@ def numpy_to_odometry(msg, frame_id="odom", child_frame_id="base_footprint"):
     })
 
 
+@instrumentation.instrumented
 def path_to_numpy(msg):
     """
     Convert a ROS Path message to a numpy array. The array will be of shape (n, 3) where n is the number of poses in the
     path. The first column will be the x position, the second column will be the y position, and the third column will be
     the orientation.
 
-    The poses are assumed to be in the same frame as the path. Map origin must be subtracted from the x and y positions
-    and then should be divided by the resolution to get the map coordinates.
+    The poses are assumed to be in the same frame as the path. Use OccupancyGridMap.world_to_map to get the map
+    coordinates, or OccupancyGridMap.path_collision to collision check the whole path.
     :param msg:
     :return: numpy array of shape (n, 3)
     """
@@ -91,24 +97,33 @@ def path_to_numpy(msg):
     return np.array(path)
 
 
+@instrumentation.instrumented
 def occupancygrid_to_numpy(msg):
     """
     Convert a ROS OccupancyGrid message to a numpy array. The array will be of shape (height, width) and will be of type
     np.int8. The values will be in the range [-1, 100] where -1 is unknown, 0 is free, and 100 is occupied. The array
-    will be masked where the value is -1.
+    will be masked where the value is -1. Raw bytes from the cbor transports are used without a copy.
     :param msg:
     :return:
     """
-    data = np.asarray(msg['data'], dtype=np.int8).reshape(msg['info']['height'], msg['info']['width'])
+    shape = (msg['info']['height'], msg['info']['width'])
+    if is_binary_payload(msg['data']):
+        data = np.frombuffer(msg['data'], dtype=np.int8).reshape(shape)
+    else:
+        with instrumentation.stage('asarray'):
+            data = np.asarray(msg['data'], dtype=np.int8).reshape(shape)
+        instrumentation.record_copy(data.nbytes)
     return np.ma.array(data, mask=data == -1, fill_value=-1)
 
 
-def numpy_to_occupancy_grid(arr, info=None, frame_id='map'):
+@instrumentation.instrumented
+def numpy_to_occupancy_grid(arr, info=None, frame_id='map', as_bytes=False):
     """
     Convert a numpy array to a ROS OccupancyGrid message.
     :param arr:
     :param info:
     :param frame_id:
+    :param as_bytes: put the raw bytes in 'data' instead of an array.array, for the cbor transports
     :return:
     """
     if not len(arr.shape) == 2:
@@ -119,7 +134,12 @@ def numpy_to_occupancy_grid(arr, info=None, frame_id='map'):
     if isinstance(arr, np.ma.MaskedArray):
         arr = arr.data
 
-    data = Array('b', arr.ravel().astype(np.int8))
+    with instrumentation.stage('tobytes'):
+        if as_bytes:
+            data = np.ascontiguousarray(arr).tobytes()
+        else:
+            data = Array('b', arr.ravel().astype(np.int8))
+    instrumentation.record_copy(len(data))
     if info is None:
         info = roslibpy.Message({
             'width': arr.shape[1],
@@ -147,3 +167,216 @@ def numpy_to_occupancy_grid(arr, info=None, frame_id='map'):
         'info': info,
         'data': data
     })
+
+
+# costmap_2d cost values
+NO_INFORMATION = 255
+LETHAL_OBSTACLE = 254
+INSCRIBED_INFLATED_OBSTACLE = 253
+FREE_SPACE = 0
+
+
+class OccupancyGridMap:
+    """A decoded OccupancyGrid that keeps the map metadata (resolution, origin position and yaw, frame) so world
+    coordinates and map cells can be converted in batches.
+
+    Cells are addressed as (mx, my) = (column, row) of the (height, width) data array, the same convention as
+    map_server. World coordinates are (x, y) in the frame of the grid.
+    """
+
+    def __init__(self, data, resolution, origin=(0.0, 0.0, 0.0), frame_id='map'):
+        """
+        :param data: (height, width) int8 array, masked where unknown, as returned by occupancygrid_to_numpy
+        :param resolution: cell size in metres
+        :param origin: (x, y, yaw) of the lower left corner of cell (0, 0)
+        :param frame_id:
+        """
+        if not isinstance(data, np.ma.MaskedArray):
+            data = np.ma.array(data, mask=data == -1, fill_value=-1)
+        if not len(data.shape) == 2:
+            raise TypeError('Array must be 2D')
+        self.data = data
+        # occupancygrid_to_numpy keeps -1 under the mask, so the raw values can be indexed without filling a copy
+        values = np.ma.getdata(data)
+        mask = np.ma.getmask(data)
+        if mask is not np.ma.nomask and np.any(values[mask] != -1):
+            values = data.filled(-1)
+        self._values = values
+        self.resolution = float(resolution)
+        self.origin = np.asarray(origin, dtype=np.float64)
+        self.frame_id = frame_id
+        self._cos = np.cos(self.origin[2])
+        self._sin = np.sin(self.origin[2])
+
+    @classmethod
+    def from_msg(cls, msg):
+        """Build the grid from a ROS OccupancyGrid message, keeping its info metadata.
+        """
+        info = msg['info']
+        position = info['origin']['position']
+        q = info['origin']['orientation']
+        yaw = np.arctan2(2 * (q['w'] * q['z'] + q['x'] * q['y']), 1 - 2 * (q['y'] * q['y'] + q['z'] * q['z']))
+        frame_id = msg.get('header', {}).get('frame_id', 'map')
+        return cls(occupancygrid_to_numpy(msg), info['resolution'], (position['x'], position['y'], yaw), frame_id)
+
+    def to_msg(self, as_bytes=False):
+        """Convert the grid back to a ROS OccupancyGrid message with the same metadata.
+        """
+        x, y, yaw = self.origin
+        info = roslibpy.Message({
+            'width': self.width,
+            'height': self.height,
+            'resolution': self.resolution,
+            'origin': {
+                'position': {
+                    'x': x,
+                    'y': y,
+                    'z': 0
+                },
+                'orientation': {
+                    'x': 0,
+                    'y': 0,
+                    'z': np.sin(yaw / 2),
+                    'w': np.cos(yaw / 2)
+                }
+            }
+        })
+        return numpy_to_occupancy_grid(self._values.astype(np.int8), info=info, frame_id=self.frame_id,
+                                       as_bytes=as_bytes)
+
+    @property
+    def width(self):
+        return self.data.shape[1]
+
+    @property
+    def height(self):
+        return self.data.shape[0]
+
+    def world_to_map(self, points):
+        """Convert an (N, 2) array of world x, y positions to (N, 2) integer (mx, my) cells. Cells may lie outside
+        the grid, see in_bounds.
+        """
+        points = np.asarray(points, dtype=np.float64)
+        dx = points[..., 0] - self.origin[0]
+        dy = points[..., 1] - self.origin[1]
+        # rotate into the grid frame
+        cells = np.empty(points.shape[:-1] + (2,), dtype=np.int64)
+        cells[..., 0] = np.floor((self._cos * dx + self._sin * dy) / self.resolution)
+        cells[..., 1] = np.floor((-self._sin * dx + self._cos * dy) / self.resolution)
+        return cells
+
+    def map_to_world(self, cells):
+        """Convert an (N, 2) array of (mx, my) cells to the (N, 2) world x, y positions of the cell centres.
+        """
+        cells = np.asarray(cells, dtype=np.float64)
+        gx = (cells[..., 0] + 0.5) * self.resolution
+        gy = (cells[..., 1] + 0.5) * self.resolution
+        points = np.empty(cells.shape[:-1] + (2,))
+        points[..., 0] = self.origin[0] + self._cos * gx - self._sin * gy
+        points[..., 1] = self.origin[1] + self._sin * gx + self._cos * gy
+        return points
+
+    def in_bounds(self, cells):
+        cells = np.asarray(cells)
+        return (cells[..., 0] >= 0) & (cells[..., 0] < self.width) & \
+            (cells[..., 1] >= 0) & (cells[..., 1] < self.height)
+
+    def values_at(self, points, outside=-1):
+        """Look up the occupancy values at an (N, 2) array of world positions. Unknown cells are -1, cells outside
+        the grid get the outside value.
+        """
+        cells = self.world_to_map(points)
+        inside = self.in_bounds(cells)
+        values = np.full(inside.shape, outside, dtype=np.int8)
+        values[inside] = self._values[cells[..., 1][inside], cells[..., 0][inside]]
+        return values
+
+    def obstacle_mask(self, threshold=50, unknown_is_occupied=False):
+        """Return a (height, width) bool array of the cells with an occupancy of at least threshold.
+        """
+        mask = self._values >= threshold
+        if unknown_is_occupied:
+            mask |= self._values == -1
+        return mask
+
+    def is_occupied(self, points, threshold=50, unknown_is_occupied=True):
+        """Return an (N,) bool array telling which world positions fall in occupied cells. Positions outside the
+        grid count as unknown.
+        """
+        values = self.values_at(points)
+        occupied = values >= threshold
+        if unknown_is_occupied:
+            occupied |= values == -1
+        return occupied
+
+    def densify_path(self, path, step=None):
+        """Resample an (N, 2) path, such as the output of path_to_numpy, so consecutive points are at most step
+        (default half a cell) apart.
+        :return: (M, 2) points and the (M,) index of the path segment every point belongs to
+        """
+        path = np.asarray(path, dtype=np.float64)
+        if len(path) < 2:
+            return path, np.zeros(len(path), dtype=np.int64)
+        step = self.resolution / 2 if step is None else step
+        deltas = np.diff(path, axis=0)
+        counts = np.maximum(np.ceil(np.hypot(deltas[:, 0], deltas[:, 1]) / step).astype(np.int64), 1)
+        segment = np.repeat(np.arange(len(deltas)), counts)
+        # fraction along each segment of every sample, 0 included and 1 left to the next segment
+        starts = np.cumsum(counts) - counts
+        fraction = (np.arange(counts.sum()) - np.repeat(starts, counts)) / np.repeat(counts, counts)
+        points = path[segment] + fraction[:, np.newaxis] * deltas[segment]
+        points = np.vstack([points, path[-1:]])
+        segment = np.append(segment, len(deltas) - 1)
+        return points, segment
+
+    def path_collision(self, path, threshold=50, unknown_is_occupied=True, costmap=None):
+        """Collision check a whole (N, 2) path in one vectorized pass, including the space between its points.
+
+        :param costmap: optional (height, width) bool array of blocked cells (e.g. from inflate) used instead of the
+            occupancy threshold
+        :return: index of the first path segment that hits an obstacle, or -1 if the path is free
+        """
+        points, segment = self.densify_path(path)
+        if costmap is None:
+            hits = self.is_occupied(points, threshold, unknown_is_occupied)
+        else:
+            cells = self.world_to_map(points)
+            inside = self.in_bounds(cells)
+            hits = np.full(inside.shape, unknown_is_occupied)
+            hits[inside] = costmap[cells[..., 1][inside], cells[..., 0][inside]]
+        if not hits.any():
+            return -1
+        return int(segment[np.argmax(hits)])
+
+    def distance_map(self, max_distance=None, threshold=50, unknown_is_occupied=False):
+        """Return the (height, width) Euclidean distance in metres from every cell to the nearest obstacle cell,
+        np.inf beyond max_distance (if given) or when the grid has no obstacles.
+        """
+        obstacles = self.obstacle_mask(threshold, unknown_is_occupied)
+        free = np.logical_not(obstacles).astype(np.uint8)
+        dist = cv2.distanceTransform(free, cv2.DIST_L2, cv2.DIST_MASK_PRECISE).astype(np.float64)
+        dist *= self.resolution
+        if max_distance is not None:
+            dist[dist > max_distance] = np.inf
+        if not obstacles.any():
+            dist[:] = np.inf
+        return dist
+
+    def inflate(self, radius, threshold=50, unknown_is_occupied=False):
+        """Return a (height, width) bool array of the cells within radius metres of an obstacle.
+        """
+        return self.distance_map(radius, threshold, unknown_is_occupied) <= radius
+
+    def costmap(self, inflation_radius, inscribed_radius=0.0, cost_scaling_factor=10.0, threshold=50):
+        """Return a costmap_2d style (height, width) uint8 costmap: 254 on obstacles, 253 within the inscribed radius,
+        exponentially decaying costs up to the inflation radius, 0 beyond it and 255 on unknown cells.
+        """
+        dist = self.distance_map(inflation_radius, threshold)
+        cost = np.zeros(dist.shape, dtype=np.uint8)
+        decay = (dist > inscribed_radius) & (dist <= inflation_radius)
+        cost[decay] = (INSCRIBED_INFLATED_OBSTACLE - 1) * np.exp(
+            -cost_scaling_factor * (dist[decay] - inscribed_radius))
+        cost[(dist > 0) & (dist <= inscribed_radius)] = INSCRIBED_INFLATED_OBSTACLE
+        cost[dist == 0] = LETHAL_OBSTACLE
+        cost[np.ma.getmaskarray(self.data)] = NO_INFORMATION
+        return cost
@@ -0,0 +1,30 @@
+import base64
+
+# types in which rosbridge delivers binary fields (uint8[], int8[]) over the cbor and cbor-raw compressions
+BINARY_TYPES = (bytes, bytearray, memoryview)
+
+
+def is_binary_payload(data):
+    return isinstance(data, BINARY_TYPES)
+
+
+def decode_payload(data):
+    """Return a buffer over a binary message field.
+
+    Base64 strings from the JSON transport are decoded. Anything else, such as raw bytes from the CBOR transports or
+    an array.array, is returned as is so np.frombuffer can use it without a copy.
+    :param data: base64 str or an object supporting the buffer protocol
+    :return: bytes-like object
+    """
+    if isinstance(data, str):
+        return base64.b64decode(data)
+    return data
+
+
+def encode_payload(data, as_bytes=False):
+    """Prepare a bytes-like buffer for a binary message field: raw bytes for the CBOR transports when as_bytes is
+    set, a base64 string for the JSON transport otherwise.
+    """
+    if as_bytes:
+        return bytes(data)
+    return base64.b64encode(data).decode('ascii')
@@ -3,6 +3,8 @@ import array
 import numpy as np
 import roslibpy
 import time
+from . import instrumentation
+from .payload import decode_payload
 
 # prefix to the names of dummy fields we add to get byte alignment
 # correct. this needs to not clash with any actual field names
@@ -85,6 +87,7 @@ def dtype_to_fields(dtype):
     return fields
 
 
+@instrumentation.instrumented
 def pointcloud2_to_array(cloud_msg, squeeze=True):
     """ Converts a roslib PointCloud2 message to a numpy recordarray
 
@@ -95,10 +98,18 @@ def pointcloud2_to_array(cloud_msg, squeeze=True):
     speed... especially for large point clouds, this will be <much> faster.
     """
     # construct a numpy record type equivalent to the point type of this cloud
-    dtype_list = fields_to_dtype(cloud_msg.fields, cloud_msg.point_step)
+    with instrumentation.stage('dtype'):
+        dtype_list = fields_to_dtype(cloud_msg.fields, cloud_msg.point_step)
+
+    # raw bytes (cbor transports) are used in place, base64 strings (json transport) are decoded
+    with instrumentation.stage('payload'):
+        data = decode_payload(cloud_msg.data)
+    if data is not cloud_msg.data:
+        instrumentation.record_copy(len(data))
 
     # parse the cloud into an array
-    cloud_arr = np.frombuffer(cloud_msg.data, dtype_list)
+    with instrumentation.stage('frombuffer'):
+        cloud_arr = np.frombuffer(data, dtype_list)
 
     # remove the dummy fields that were added
     cloud_arr = cloud_arr[
@@ -111,8 +122,12 @@ def pointcloud2_to_array(cloud_msg, squeeze=True):
         return np.reshape(cloud_arr, (cloud_msg.height, cloud_msg.width))
 
 
-def array_to_pointcloud2(cloud_arr, frame_id='base_link'):
+@instrumentation.instrumented
+def array_to_pointcloud2(cloud_arr, frame_id='base_link', as_bytes=False):
     """Converts a numpy record array to a sensor_msgs.msg.PointCloud2.
+
+    With as_bytes the data field holds raw bytes for the cbor transports
+    instead of an array.array.
     """
     # make it 2d (even if height will be 1)
     cloud_arr = np.atleast_2d(cloud_arr)
@@ -122,9 +137,10 @@ def array_to_pointcloud2(cloud_arr, frame_id='base_link'):
     is_bigendian = sys.byteorder != 'little'
     point_step = cloud_arr.dtype.itemsize
     row_step = point_step * cloud_arr.shape[1]
-    is_dense = \
-        all([np.isfinite(
-            cloud_arr[fname]).all() for fname in cloud_arr.dtype.names])
+    with instrumentation.stage('is_dense'):
+        is_dense = \
+            all([np.isfinite(
+                cloud_arr[fname]).all() for fname in cloud_arr.dtype.names])
 
     # The PointCloud2.data setter will create an array.array object for you if you don't
     # provide it one directly. This causes very slow performance because it iterates
@@ -137,9 +153,13 @@ def array_to_pointcloud2(cloud_arr, frame_id='base_link'):
     else:
         # Casting raises a TypeError if the array has no elements
         array_bytes = b""
-    as_array = array.array("B")
-    as_array.frombytes(array_bytes)
-    data = as_array
+    with instrumentation.stage('tobytes'):
+        if as_bytes:
+            data = bytes(array_bytes)
+        else:
+            data = array.array("B")
+            data.frombytes(array_bytes)
+    instrumentation.record_copy(len(data))
     cloud_msg = roslibpy.Message({
         'header': {
             'stamp': time.time(),
@@ -158,6 +178,7 @@ def array_to_pointcloud2(cloud_arr, frame_id='base_link'):
     return cloud_msg
 
 
+@instrumentation.instrumented
 def merge_rgb_fields(cloud_arr):
     """Takes an array with named np.uint8 fields 'r', 'g', and 'b', and returns
        an array in which they have been merged into a single np.float32 'rgb'
@@ -184,6 +205,7 @@ def merge_rgb_fields(cloud_arr):
             new_dtype.append((field_name, field_type))
     new_dtype.append(('rgb', np.float32))
     new_cloud_arr = np.zeros(cloud_arr.shape, new_dtype)
+    instrumentation.record_copy(new_cloud_arr.nbytes)
 
     # fill in the new array
     for field_name in new_cloud_arr.dtype.names:
@@ -195,6 +217,7 @@ def merge_rgb_fields(cloud_arr):
     return new_cloud_arr
 
 
+@instrumentation.instrumented
 def split_rgb_field(cloud_arr):
     """Takes an array with a named 'rgb' float32 field, and returns an array in
     which this has been split into 3 uint 8 fields: 'r', 'g', and 'b'.
@@ -202,6 +225,7 @@ def split_rgb_field(cloud_arr):
     (pcl stores rgb in packed 32 bit floats)
     """
     rgb_arr = cloud_arr['rgb'].copy()
+    instrumentation.record_copy(rgb_arr.nbytes)
     rgb_arr.dtype = np.uint32
     r = np.asarray((rgb_arr >> 16) & 255, dtype=np.uint8)
     g = np.asarray((rgb_arr >> 8) & 255, dtype=np.uint8)
@@ -217,6 +241,7 @@ def split_rgb_field(cloud_arr):
     new_dtype.append(('g', np.uint8))
     new_dtype.append(('b', np.uint8))
     new_cloud_arr = np.zeros(cloud_arr.shape, new_dtype)
+    instrumentation.record_copy(new_cloud_arr.nbytes)
 
     # fill in the new array
     for field_name in new_cloud_arr.dtype.names:
@@ -231,6 +256,7 @@ def split_rgb_field(cloud_arr):
     return new_cloud_arr
 
 
+@instrumentation.instrumented
 def get_xyz_points(cloud_array, remove_nans=True, dtype=float):
     """Pulls out x, y, and z columns from the cloud recordarray, and returns
     a 3xN matrix.
@@ -241,9 +267,11 @@ def get_xyz_points(cloud_array, remove_nans=True, dtype=float):
                np.isfinite(cloud_array['y']) & \
                np.isfinite(cloud_array['z'])
         cloud_array = cloud_array[mask]
+        instrumentation.record_copy(cloud_array.nbytes)
 
     # pull out x, y, and z values
     points = np.zeros(cloud_array.shape + (3,), dtype=dtype)
+    instrumentation.record_copy(points.nbytes)
     points[..., 0] = cloud_array['x']
     points[..., 1] = cloud_array['y']
     points[..., 2] = cloud_array['z']
@@ -251,6 +279,7 @@ def get_xyz_points(cloud_array, remove_nans=True, dtype=float):
     return points
 
 
+@instrumentation.instrumented
 def pointcloud2_to_xyz_array(cloud_msg, remove_nans=True):
     return get_xyz_points(
         pointcloud2_to_array(cloud_msg), remove_nans=remove_nans)
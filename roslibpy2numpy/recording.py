@@ -0,0 +1,282 @@
+import os
+import json
+import numpy as np
+from .geometry import header_stamp_to_sec
+
+# name of the single column used when a converter returns a bare array
+# rather than a dict of arrays (e.g. raw_image_to_numpy, pointcloud2_to_array)
+ARRAY_COLUMN = 'data'
+
+# suffix of the extra column holding the mask of a masked array column
+MASK_SUFFIX = '__mask'
+
+META_FILE = 'meta.json'
+STAMPS_FILE = 'stamps.bin'
+INDEX_FILE = 'index.bin'
+CHUNK_FILE = 'chunk_%05d.bin'
+
+
+def _index_dtype(ndim):
+    return np.dtype([('chunk', '<u4'), ('offset', '<u8'), ('nbytes', '<u8'), ('shape', '<i8', (ndim,))])
+
+
+def _split_columns(value):
+    """Flatten a converter output into a dict of plain ndarrays, splitting masked arrays into data and mask columns.
+    Also returns the fill value of every masked column.
+    """
+    if isinstance(value, dict):
+        kind = 'dict'
+        items = value.items()
+    else:
+        kind = 'array'
+        items = [(ARRAY_COLUMN, value)]
+
+    columns = {}
+    fill_values = {}
+    for name, arr in items:
+        if isinstance(arr, np.ma.MaskedArray):
+            columns[name + MASK_SUFFIX] = np.ma.getmaskarray(arr)
+            fill_values[name] = np.asarray(arr.fill_value).tolist()
+            arr = arr.data
+        columns[name] = np.asarray(arr)
+    return kind, columns, fill_values
+
+
+class _ColumnWriter:
+    def __init__(self, path, dtype, ndim, chunk_size):
+        self.path = path
+        self.dtype = dtype
+        self.ndim = ndim
+        self.chunk_size = chunk_size
+        self.index_dtype = _index_dtype(ndim)
+        os.makedirs(path)
+        self.index_file = open(os.path.join(path, INDEX_FILE), 'wb')
+        self.chunk = 0
+        self.offset = 0
+        self.chunk_file = open(os.path.join(path, CHUNK_FILE % self.chunk), 'wb')
+
+    def check(self, arr):
+        if arr.dtype != self.dtype:
+            raise TypeError('Column {} is {}, got {}'.format(self.path, self.dtype, arr.dtype))
+        if arr.ndim != self.ndim:
+            raise TypeError('Column {} is {}-dimensional, got {}'.format(self.path, self.ndim, arr.ndim))
+
+    def write(self, arr):
+        data = np.ascontiguousarray(arr)
+        if self.offset > 0 and self.offset + data.nbytes > self.chunk_size:
+            self.chunk_file.close()
+            self.chunk += 1
+            self.offset = 0
+            self.chunk_file = open(os.path.join(self.path, CHUNK_FILE % self.chunk), 'wb')
+
+        self.chunk_file.write(memoryview(data).cast('B') if data.nbytes > 0 else b'')
+        entry = np.zeros((), self.index_dtype)
+        entry['chunk'] = self.chunk
+        entry['offset'] = self.offset
+        entry['nbytes'] = data.nbytes
+        entry['shape'] = data.shape
+        self.index_file.write(entry.tobytes())
+        self.offset += data.nbytes
+
+    def flush(self):
+        self.chunk_file.flush()
+        self.index_file.flush()
+
+    def close(self):
+        self.chunk_file.close()
+        self.index_file.close()
+
+
+class StreamRecorder:
+    """Appends the output of a converter (a bare array or a dict of arrays, such as the result of
+    pointcloud2_to_array, raw_image_to_numpy or odometry_to_numpy) to a chunked, columnar directory on disk.
+
+    Every column gets its own directory of raw chunk files plus a fixed-size index, and a shared stamps file holds
+    the timestamp of every frame. Use StreamReader to memory-map the recording back.
+    """
+
+    def __init__(self, path, chunk_size=64 * 1024 * 1024):
+        if os.path.exists(os.path.join(path, META_FILE)):
+            raise FileExistsError('A recording already exists at {}'.format(path))
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.chunk_size = chunk_size
+        self.kind = None
+        self.columns = {}
+        self.fill_values = {}
+        self.last_stamp = None
+        self.stamps_file = open(os.path.join(path, STAMPS_FILE), 'wb')
+        # written up front so a recording closed before its first frame still reads back empty
+        self._write_meta()
+
+    def append(self, stamp, value):
+        """Append one converted frame.
+        :param stamp: header stamp dict or float seconds, must not decrease between frames
+        :param value: ndarray, masked array or dict of those, as returned by the converters
+        :return:
+        """
+        stamp = header_stamp_to_sec(stamp)
+        if self.last_stamp is not None and stamp < self.last_stamp:
+            raise ValueError('Stamps must be non-decreasing, got {} after {}'.format(stamp, self.last_stamp))
+
+        kind, columns, fill_values = _split_columns(value)
+        if self.kind is None:
+            self.kind = kind
+            self.fill_values = fill_values
+            for name, arr in columns.items():
+                self.columns[name] = _ColumnWriter(
+                    os.path.join(self.path, name), arr.dtype, arr.ndim, self.chunk_size)
+            self._write_meta()
+        elif kind != self.kind or columns.keys() != self.columns.keys():
+            raise TypeError('Frame layout does not match the recording: {}'.format(sorted(columns)))
+
+        # validate the whole frame first, a partially written frame would shift every later one
+        for name, arr in columns.items():
+            self.columns[name].check(arr)
+        for name, arr in columns.items():
+            self.columns[name].write(arr)
+        self.stamps_file.write(np.array(stamp, '<f8').tobytes())
+        self.last_stamp = stamp
+
+    def _write_meta(self):
+        meta = {
+            'kind': self.kind,
+            'columns': {
+                name: {
+                    'dtype': np.lib.format.dtype_to_descr(column.dtype),
+                    'ndim': column.ndim,
+                    'fill_value': self.fill_values.get(name)
+                } for name, column in self.columns.items()
+            }
+        }
+        with open(os.path.join(self.path, META_FILE), 'w') as f:
+            json.dump(meta, f)
+
+    def flush(self):
+        for column in self.columns.values():
+            column.flush()
+        self.stamps_file.flush()
+
+    def close(self):
+        for column in self.columns.values():
+            column.close()
+        self.stamps_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _descr_from_json(descr):
+    # json turns the (name, type[, shape]) tuples of a structured descr into lists
+    if not isinstance(descr, list):
+        return descr
+    fields = []
+    for field in descr:
+        field = [field[0], _descr_from_json(field[1])] + [tuple(s) for s in field[2:]]
+        fields.append(tuple(field))
+    return fields
+
+
+class StreamReader:
+    """Memory-maps a recording written by StreamRecorder.
+
+    Frames are returned as read-only views into the mapped chunk files with the same dtypes the live converters
+    produce, so reading one frame or a time range never loads the rest of the recording.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, META_FILE)) as f:
+            meta = json.load(f)
+        self.kind = meta['kind']
+
+        self.stamps = self._map(os.path.join(path, STAMPS_FILE), np.dtype('<f8'))
+        self.dtypes = {}
+        self.indices = {}
+        self.fill_values = {}
+        for name, column in meta['columns'].items():
+            self.dtypes[name] = np.lib.format.descr_to_dtype(_descr_from_json(column['dtype']))
+            fill_value = column.get('fill_value')
+            # json turns the fill value of a structured column into a list
+            self.fill_values[name] = tuple(fill_value) if isinstance(fill_value, list) else fill_value
+            self.indices[name] = self._map(os.path.join(path, name, INDEX_FILE), _index_dtype(column['ndim']))
+        # a frame is complete once its stamp has been written
+        self.stamps = self.stamps[:min([len(self.stamps)] + [len(index) for index in self.indices.values()])]
+        self._chunks = {}
+
+    @staticmethod
+    def _map(filename, dtype):
+        if os.path.getsize(filename) < dtype.itemsize:
+            return np.zeros(0, dtype)
+        count = os.path.getsize(filename) // dtype.itemsize
+        return np.memmap(filename, dtype=dtype, mode='r', shape=(count,))
+
+    def _chunk(self, name, chunk):
+        key = (name, chunk)
+        if key not in self._chunks:
+            self._chunks[key] = np.memmap(os.path.join(self.path, name, CHUNK_FILE % chunk), dtype=np.uint8, mode='r')
+        return self._chunks[key]
+
+    def _column(self, name, i):
+        entry = self.indices[name][i]
+        dtype = self.dtypes[name]
+        shape = tuple(entry['shape'])
+        if entry['nbytes'] == 0:
+            return np.zeros(shape, dtype)
+        buf = self._chunk(name, int(entry['chunk']))
+        count = int(entry['nbytes']) // dtype.itemsize
+        return np.frombuffer(buf, dtype=dtype, count=count, offset=int(entry['offset'])).reshape(shape)
+
+    def __len__(self):
+        return len(self.stamps)
+
+    def __getitem__(self, i):
+        """Return frame i in the structure it was recorded with (bare array or dict of arrays).
+        """
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError('Frame {} out of range'.format(i))
+
+        frame = {}
+        for name in self.dtypes:
+            if name.endswith(MASK_SUFFIX):
+                continue
+            data = self._column(name, i)
+            if name + MASK_SUFFIX in self.dtypes:
+                data = np.ma.array(data, mask=self._column(name + MASK_SUFFIX, i),
+                                   fill_value=self.fill_values[name])
+            frame[name] = data
+        if self.kind == 'array':
+            return frame[ARRAY_COLUMN]
+        return frame
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def nearest(self, t):
+        """Return the index of the frame whose stamp is closest to t.
+        """
+        if len(self) == 0:
+            raise IndexError('Recording is empty')
+        i = int(np.searchsorted(self.stamps, t))
+        if i == len(self) or (i > 0 and t - self.stamps[i - 1] <= self.stamps[i] - t):
+            i -= 1
+        return i
+
+    def time_range(self, start, end):
+        """Return the frame indices with start <= stamp < end as a range.
+        """
+        first = int(np.searchsorted(self.stamps, start, side='left'))
+        last = int(np.searchsorted(self.stamps, end, side='left'))
+        return range(first, last)
+
+    def read_range(self, start, end):
+        """Yield (stamp, frame) for every frame with start <= stamp < end.
+        """
+        for i in self.time_range(start, end):
+            yield float(self.stamps[i]), self[i]
@@ -0,0 +1,131 @@
+import bisect
+import threading
+from .geometry import header_stamp_to_sec
+
+
+def _header_stamp(msg):
+    return header_stamp_to_sec(msg['header']['stamp'])
+
+
+class ApproximateTimeSynchronizer:
+    """Match messages from several topics whose header stamps lie within slop seconds of each other, like
+    message_filters.ApproximateTimeSynchronizer, and hand back the tuple of converted arrays.
+
+    Raw messages are kept in bounded, stamp-sorted queues and only the messages of a matched set are passed through
+    their converter (e.g. raw_image_to_numpy, pointcloud2_to_array, odometry_to_numpy), so messages that are dropped
+    never pay the decode cost.
+
+    Matching starts from the earliest queued message (the pivot) and takes the head of every other queue, which
+    minimises the spread of a set containing the pivot. A pivot that cannot fit within slop is dropped, and so is a
+    pivot whose successor on the same topic gives a tighter set. Assuming every topic delivers its messages in stamp
+    order, only a later message on the pivot's own topic could still tighten a set, so a set is published once its
+    stamps are identical, another topic shares the pivot stamp, or the pivot topic has delivered a newer message.
+
+    Usage with roslibpy::
+
+        sync = ApproximateTimeSynchronizer([raw_image_to_numpy, pointcloud2_to_array], queue_size=10, slop=0.05)
+        sync.register_callback(lambda image, cloud: ...)
+        image_topic.subscribe(sync.subscriber(0))
+        cloud_topic.subscribe(sync.subscriber(1))
+    """
+
+    def __init__(self, converters, queue_size=10, slop=0.1, stamp_getter=_header_stamp):
+        """
+        :param converters: one callable per topic, applied to the raw message once it is part of a matched set.
+            Pass None to hand back the raw message.
+        :param queue_size: maximum number of unmatched messages kept per topic, the oldest are dropped first
+        :param slop: maximum difference in seconds between the stamps of a matched set
+        :param stamp_getter: returns the stamp in seconds of a raw message
+        """
+        if len(converters) < 2:
+            raise ValueError('Expected at least two topics')
+        if queue_size < 1:
+            raise ValueError('Expected a positive queue size')
+        self.converters = list(converters)
+        self.queue_size = queue_size
+        self.slop = slop
+        self.stamp_getter = stamp_getter
+        self.callbacks = []
+        # per topic, parallel stamp-sorted lists of stamps and raw messages
+        self._stamps = [[] for _ in self.converters]
+        self._queues = [[] for _ in self.converters]
+        # per topic, the newest stamp received so far
+        self._latest = [float('-inf') for _ in self.converters]
+        self._lock = threading.Lock()
+
+    def register_callback(self, callback):
+        """Call callback(*arrays) for every matched set.
+        """
+        self.callbacks.append(callback)
+
+    def subscriber(self, index):
+        """Return a function that can be passed to roslibpy.Topic.subscribe for topic index.
+        """
+        return lambda msg: self.add(index, msg)
+
+    def add(self, index, msg):
+        """Queue a raw message of topic index.
+        :return: the tuple of converted arrays of the last set the message completed, otherwise None
+        """
+        stamp = self.stamp_getter(msg)
+        with self._lock:
+            stamps = self._stamps[index]
+            queue = self._queues[index]
+            i = bisect.bisect_right(stamps, stamp)
+            stamps.insert(i, stamp)
+            queue.insert(i, msg)
+            if len(queue) > self.queue_size:
+                del stamps[0]
+                del queue[0]
+            self._latest[index] = max(self._latest[index], stamp)
+
+            # popping a set can expose another one, so keep matching until nothing is settled
+            matches = []
+            matched = self._match()
+            while matched is not None:
+                matches.append(matched)
+                matched = self._match()
+
+        arrays = None
+        for matched in matches:
+            arrays = tuple(msg if converter is None else converter(msg)
+                           for converter, msg in zip(self.converters, matched))
+            for callback in self.callbacks:
+                callback(*arrays)
+        return arrays
+
+    def _match(self):
+        """Pop and return the next settled set, or None if there is none yet.
+        """
+        while all(self._stamps):
+            heads = [stamps[0] for stamps in self._stamps]
+            pivot = min(heads)
+            spread = max(heads) - pivot
+            p = heads.index(pivot)
+
+            if max(heads) > pivot + self.slop:
+                # some topic has nothing within slop of the pivot, and its later messages are even further away
+                self._pop(p)
+                continue
+
+            pivot_stamps = self._stamps[p]
+            if len(pivot_stamps) > 1 and heads.count(pivot) == 1:
+                candidates = heads[:p] + [pivot_stamps[1]] + heads[p + 1:]
+                if max(candidates) - min(candidates) < spread:
+                    # the next message on the pivot topic gives a tighter set
+                    self._pop(p)
+                    continue
+
+            if spread > 0 and heads.count(pivot) == 1 and self._latest[p] <= pivot:
+                # the next message on the pivot topic could still tighten the set
+                return None
+
+            matched = [queue[0] for queue in self._queues]
+            for index in range(len(self._queues)):
+                self._pop(index)
+            return matched
+        return None
+
+    def _pop(self, index):
+        del self._stamps[index][0]
+        del self._queues[index][0]
@@ -0,0 +1,272 @@
+import numpy as np
+from .geometry import header_stamp_to_sec
+
+
+def _normalize_frame_id(frame_id):
+    return frame_id.lstrip('/')
+
+
+def _is_batched(t):
+    return isinstance(t, (np.ndarray, list, tuple))
+
+
+def quaternions_to_matrices(quats):
+    """Convert an (..., 4) array of x, y, z, w quaternions to an (..., 3, 3) array of rotation matrices.
+    """
+    quats = np.asarray(quats, dtype=np.float64)
+    quats = quats / np.linalg.norm(quats, axis=-1, keepdims=True)
+    x, y, z, w = quats[..., 0], quats[..., 1], quats[..., 2], quats[..., 3]
+    rot = np.empty(quats.shape[:-1] + (3, 3))
+    rot[..., 0, 0] = 1 - 2 * (y * y + z * z)
+    rot[..., 0, 1] = 2 * (x * y - z * w)
+    rot[..., 0, 2] = 2 * (x * z + y * w)
+    rot[..., 1, 0] = 2 * (x * y + z * w)
+    rot[..., 1, 1] = 1 - 2 * (x * x + z * z)
+    rot[..., 1, 2] = 2 * (y * z - x * w)
+    rot[..., 2, 0] = 2 * (x * z - y * w)
+    rot[..., 2, 1] = 2 * (y * z + x * w)
+    rot[..., 2, 2] = 1 - 2 * (x * x + y * y)
+    return rot
+
+
+def slerp(q0, q1, alpha):
+    """Spherical linear interpolation between (..., 4) arrays of quaternions, with alpha broadcast over the leading
+    dimensions.
+    """
+    alpha = np.asarray(alpha, dtype=np.float64)[..., np.newaxis]
+    dot = np.sum(q0 * q1, axis=-1, keepdims=True)
+    # take the short way around
+    q1 = np.where(dot < 0, -q1, q1)
+    dot = np.clip(np.abs(dot), 0.0, 1.0)
+    theta = np.arccos(dot)
+    sin_theta = np.sin(theta)
+    # fall back to lerp where the quaternions are (nearly) identical
+    small = sin_theta < 1e-6
+    safe_sin = np.where(small, 1.0, sin_theta)
+    w0 = np.where(small, 1 - alpha, np.sin((1 - alpha) * theta) / safe_sin)
+    w1 = np.where(small, alpha, np.sin(alpha * theta) / safe_sin)
+    q = w0 * q0 + w1 * q1
+    return q / np.linalg.norm(q, axis=-1, keepdims=True)
+
+
+class _EdgeBuffer:
+    """Time-indexed translations and rotations of one parent -> child edge of the tree.
+    """
+
+    def __init__(self, static=False, capacity=16):
+        self.static = static
+        self.size = 0
+        self.stamps = np.empty(capacity)
+        self.translations = np.empty((capacity, 3))
+        self.rotations = np.empty((capacity, 4))
+
+    def _grow(self):
+        capacity = 2 * len(self.stamps)
+        for name in ('stamps', 'translations', 'rotations'):
+            old = getattr(self, name)
+            new = np.empty((capacity,) + old.shape[1:])
+            new[:self.size] = old[:self.size]
+            setattr(self, name, new)
+
+    def insert(self, stamp, translation, rotation, cache_time):
+        if self.static:
+            self.size = 0
+        if self.size == len(self.stamps):
+            self._grow()
+
+        n = self.size
+        if n == 0 or stamp >= self.stamps[n - 1]:
+            i = n
+        else:
+            # late message, keep the samples sorted
+            i = int(np.searchsorted(self.stamps[:n], stamp, side='right'))
+            self.stamps[i + 1:n + 1] = self.stamps[i:n]
+            self.translations[i + 1:n + 1] = self.translations[i:n]
+            self.rotations[i + 1:n + 1] = self.rotations[i:n]
+        self.stamps[i] = stamp
+        self.translations[i] = translation
+        self.rotations[i] = rotation
+        self.size = n + 1
+
+        if not self.static and cache_time is not None:
+            # drop samples older than cache_time, in batches so it stays amortized O(1) per insert
+            stale = int(np.searchsorted(self.stamps[:self.size], self.stamps[self.size - 1] - cache_time))
+            if stale > self.size // 2:
+                keep = self.size - stale
+                self.stamps[:keep] = self.stamps[stale:self.size]
+                self.translations[:keep] = self.translations[stale:self.size]
+                self.rotations[:keep] = self.rotations[stale:self.size]
+                self.size = keep
+
+    @property
+    def latest(self):
+        return self.stamps[self.size - 1]
+
+    def sample(self, t):
+        """Interpolate the edge at the (M,) stamps t, or at the latest stamp when t is None.
+        :return: (M, 3) translations and (M, 4) x, y, z, w rotations
+        """
+        n = self.size
+        if t is None or self.static:
+            m = 1 if t is None else len(t)
+            return (np.repeat(self.translations[n - 1:n], m, axis=0),
+                    np.repeat(self.rotations[n - 1:n], m, axis=0))
+
+        stamps = self.stamps[:n]
+        if np.any(t < stamps[0]) or np.any(t > stamps[n - 1]):
+            raise ValueError('Lookup at {} would require extrapolation, data is available in [{}, {}]'.format(
+                t, stamps[0], stamps[n - 1]))
+        if n == 1:
+            return (np.repeat(self.translations[:1], len(t), axis=0),
+                    np.repeat(self.rotations[:1], len(t), axis=0))
+
+        i = np.clip(np.searchsorted(stamps, t, side='right'), 1, n - 1)
+        t0 = stamps[i - 1]
+        t1 = stamps[i]
+        alpha = np.where(t1 > t0, (t - t0) / np.where(t1 > t0, t1 - t0, 1.0), 0.0)
+        translations = self.translations[i - 1] + alpha[:, np.newaxis] * (
+                self.translations[i] - self.translations[i - 1])
+        rotations = slerp(self.rotations[i - 1], self.rotations[i], alpha)
+        return translations, rotations
+
+
+class TransformBuffer:
+    """A tf2 style buffer of the transform tree, fed with tf2_msgs/TFMessage dicts from /tf and /tf_static.
+
+    Every parent -> child edge is kept as time-indexed arrays, lookups interpolate all edges of the chain in one
+    vectorized pass (lerp for translations, slerp for rotations) and the chain between two frames is cached until
+    the tree changes.
+    """
+
+    def __init__(self, cache_time=10.0):
+        self.cache_time = cache_time
+        self._edges = {}
+        self._parents = {}
+        self._chains = {}
+
+    @property
+    def frames(self):
+        return set(self._parents) | set(self._parents.values())
+
+    def ingest(self, msg, static=False):
+        """Add every transform of a tf2_msgs/TFMessage dict. Pass static=True for messages from /tf_static.
+        """
+        for transform in msg['transforms']:
+            self.set_transform(transform, static=static)
+
+    def set_transform(self, transform, static=False):
+        """Add a single geometry_msgs/TransformStamped dict.
+        """
+        parent = _normalize_frame_id(transform['header']['frame_id'])
+        child = _normalize_frame_id(transform['child_frame_id'])
+        if parent == child:
+            raise ValueError('Frame {} cannot be its own parent'.format(child))
+        stamp = header_stamp_to_sec(transform['header'].get('stamp', 0))
+        t = transform['transform']['translation']
+        q = transform['transform']['rotation']
+
+        if self._parents.get(child) != parent:
+            # the tree changed: reparenting drops the old edge and every cached chain
+            self._edges.pop((self._parents.get(child), child), None)
+            self._parents[child] = parent
+            self._chains.clear()
+        key = (parent, child)
+        if key not in self._edges:
+            self._edges[key] = _EdgeBuffer(static=static)
+        # the latest publisher decides, e.g. an edge moving from /tf to /tf_static keeps only its static sample
+        self._edges[key].static = static
+        self._edges[key].insert(stamp, (t['x'], t['y'], t['z']), (q['x'], q['y'], q['z'], q['w']), self.cache_time)
+
+    def _path_to_root(self, frame):
+        path = [frame]
+        while path[-1] in self._parents:
+            path.append(self._parents[path[-1]])
+            if len(path) > len(self._parents) + 1:
+                raise ValueError('Loop in the transform tree at {}'.format(frame))
+        return path
+
+    def _chain(self, target, source):
+        """Return the edges walked up from source and from target to their closest common ancestor.
+        """
+        key = (target, source)
+        if key not in self._chains:
+            if target not in self.frames or source not in self.frames:
+                raise ValueError('Unknown frame {}'.format(target if target not in self.frames else source))
+            source_path = self._path_to_root(source)
+            target_path = self._path_to_root(target)
+            target_frames = set(target_path)
+            common = next((frame for frame in source_path if frame in target_frames), None)
+            if common is None:
+                raise ValueError('Frames {} and {} are not connected'.format(target, source))
+            source_edges = [(parent, child) for child, parent in
+                            zip(source_path[:source_path.index(common)], source_path[1:])]
+            target_edges = [(parent, child) for child, parent in
+                            zip(target_path[:target_path.index(common)], target_path[1:])]
+            self._chains[key] = (source_edges, target_edges)
+        return self._chains[key]
+
+    def _compose(self, edges, t, m):
+        rot = np.broadcast_to(np.eye(3), (m, 3, 3))
+        trans = np.zeros((m, 3))
+        for edge in edges:
+            edge_trans, edge_quat = self._edges[edge].sample(t)
+            edge_rot = quaternions_to_matrices(edge_quat)
+            # T_parent_frame = T_parent_child @ T_child_frame
+            trans = np.einsum('mij,mj->mi', edge_rot, trans) + edge_trans
+            rot = np.matmul(edge_rot, rot)
+        return rot, trans
+
+    def can_transform(self, target, source, t=None):
+        try:
+            self.lookup(target, source, t)
+        except ValueError:
+            return False
+        return True
+
+    def lookup(self, target, source, t=None):
+        """Return the 4x4 homogeneous transform taking points in the source frame to the target frame.
+
+        :param target: target frame id
+        :param source: source frame id
+        :param t: stamp (header stamp dict or float seconds), array of (M,) float stamps, or None for the latest
+            time at which every edge of the chain has data
+        :return: (4, 4) array, or (M, 4, 4) when t is an array
+        """
+        target = _normalize_frame_id(target)
+        source = _normalize_frame_id(source)
+        batched = _is_batched(t)
+        if batched:
+            times = np.asarray(t, dtype=np.float64).ravel()
+        elif t is None:
+            times = None
+        else:
+            times = np.array([header_stamp_to_sec(t)])
+        source_edges, target_edges = self._chain(target, source)
+        if times is None:
+            latest = [self._edges[edge].latest for edge in source_edges + target_edges
+                      if not self._edges[edge].static]
+            if latest:
+                # like tf2, resolve "latest" to the latest common time of the chain
+                times = np.array([min(latest)])
+        m = 1 if times is None else len(times)
+
+        source_rot, source_trans = self._compose(source_edges, times, m)
+        target_rot, target_trans = self._compose(target_edges, times, m)
+
+        # T_target_source = inv(T_common_target) @ T_common_source
+        inv_rot = np.swapaxes(target_rot, -1, -2)
+        mat = np.zeros((m, 4, 4))
+        mat[:, :3, :3] = np.matmul(inv_rot, source_rot)
+        mat[:, :3, 3] = np.einsum('mij,mj->mi', inv_rot, source_trans - target_trans)
+        mat[:, 3, 3] = 1.0
+        return mat if batched else mat[0]
+
+    def transform_points(self, points, target, source, t=None):
+        """Transform an (N, 3) array of points, e.g. from pointcloud2_to_xyz_array, from the source to the target
+        frame with a single matrix multiplication.
+        """
+        if _is_batched(t):
+            raise TypeError('transform_points takes a single stamp')
+        mat = self.lookup(target, source, t)
+        points = np.asarray(points)
+        return points @ mat[:3, :3].T + mat[:3, 3]
@@ -0,0 +1,42 @@
+import unittest
+import numpy as np
+import roslibpy2numpy
+
+
+class TestDepthProjection(unittest.TestCase):
+    def setUp(self):
+        self.info = {
+            'width': 4,
+            'height': 3,
+            'distortion_model': 'plumb_bob',
+            'd': [0.0] * 5,
+            'k': [2.0, 0.0, 2.0, 0.0, 2.0, 1.0, 0.0, 0.0, 1.0],
+            'r': [1.0, 0.0, 0.0, 0.0, 1.0, 0.0, 0.0, 0.0, 1.0],
+            'p': [2.0, 0.0, 2.0, 0.0, 0.0, 2.0, 1.0, 0.0, 0.0, 0.0, 1.0, 0.0]
+        }
+        self.depth = np.full((3, 4), 2000, dtype=np.uint16)
+        self.depth[0, 0] = 0
+
+    def test_depth_image_to_array(self):
+        cloud = roslibpy2numpy.camera.depth_image_to_array(self.depth, self.info)
+        self.assertEqual(cloud.shape, (11,))
+        self.assertEqual(cloud.dtype.names, ('x', 'y', 'z'))
+        np.testing.assert_allclose(cloud['z'], 2.0)
+        # pixel (u=3, v=2) is one focal length right and down of the principal point
+        np.testing.assert_allclose([cloud['x'][-1], cloud['y'][-1]], [1.0, 1.0])
+        msg = roslibpy2numpy.point_cloud2.array_to_pointcloud2(cloud)
+        self.assertEqual(msg['point_step'], 12)
+
+    def test_organized_rgb_and_step(self):
+        rgb = np.zeros((3, 4, 3), dtype=np.uint8)
+        rgb[..., 2] = 255
+        cloud = roslibpy2numpy.camera.depth_image_to_array(
+            self.depth.astype(np.float32) / 1000, self.info, rgb=rgb, organized=True, step=2)
+        self.assertEqual(cloud.shape, (2, 2))
+        self.assertTrue(np.isnan(cloud['z'][0, 0]))
+        self.assertEqual(roslibpy2numpy.point_cloud2.split_rgb_field(cloud)['r'][1, 1], 255)
+
+    def test_ray_grid_is_cached(self):
+        first = roslibpy2numpy.camera.depth_ray_grid(self.info)
+        second = roslibpy2numpy.camera.depth_ray_grid(roslibpy2numpy.camera.camerainfo_to_numpy(self.info))
+        self.assertIs(first, second)
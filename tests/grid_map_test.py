@@ -0,0 +1,66 @@
+import unittest
+import numpy as np
+import roslibpy2numpy
+
+
+def occupancy_grid_msg(data, resolution=0.5, x=0.0, y=0.0, yaw=0.0):
+    return {
+        'header': {'frame_id': 'map'},
+        'info': {
+            'width': data.shape[1],
+            'height': data.shape[0],
+            'resolution': resolution,
+            'origin': {
+                'position': {'x': x, 'y': y, 'z': 0.0},
+                'orientation': {'x': 0.0, 'y': 0.0, 'z': np.sin(yaw / 2), 'w': np.cos(yaw / 2)}
+            }
+        },
+        'data': data.ravel().tolist()
+    }
+
+
+class TestOccupancyGridMap(unittest.TestCase):
+    def setUp(self):
+        data = np.zeros((10, 10), dtype=np.int8)
+        data[5, 5] = 100
+        data[0, 9] = -1
+        self.grid = roslibpy2numpy.navigation.OccupancyGridMap.from_msg(
+            occupancy_grid_msg(data, x=-1.0, y=-2.0))
+
+    def test_world_map_round_trip(self):
+        cells = np.array([[0, 0], [5, 5], [9, 3]])
+        points = self.grid.map_to_world(cells)
+        np.testing.assert_allclose(points[0], [-0.75, -1.75])
+        np.testing.assert_array_equal(self.grid.world_to_map(points), cells)
+
+    def test_rotated_origin(self):
+        data = np.zeros((4, 4), dtype=np.int8)
+        grid = roslibpy2numpy.navigation.OccupancyGridMap.from_msg(
+            occupancy_grid_msg(data, resolution=1.0, x=1.0, y=1.0, yaw=np.pi / 2))
+        np.testing.assert_allclose(grid.map_to_world([[0, 0], [2, 0]]), [[0.5, 1.5], [0.5, 3.5]], atol=1e-12)
+        np.testing.assert_array_equal(grid.world_to_map([[0.5, 3.5]]), [[2, 0]])
+
+    def test_occupancy_lookup(self):
+        points = self.grid.map_to_world([[5, 5], [1, 1], [9, 0], [20, 20]])
+        np.testing.assert_array_equal(self.grid.values_at(points), [100, 0, -1, -1])
+        np.testing.assert_array_equal(self.grid.is_occupied(points), [True, False, True, True])
+
+    def test_path_collision(self):
+        free = self.grid.map_to_world([[1, 1], [1, 8], [3, 8]])
+        self.assertEqual(self.grid.path_collision(free), -1)
+        # the obstacle lies between the path points, not on them
+        blocked = self.grid.map_to_world([[1, 1], [2, 5], [8, 5]])
+        self.assertEqual(self.grid.path_collision(blocked), 1)
+
+    def test_costmap(self):
+        dist = self.grid.distance_map(1.0)
+        self.assertEqual(dist[5, 5], 0.0)
+        self.assertEqual(dist[5, 7], 1.0)
+        self.assertEqual(dist[5, 8], np.inf)
+        cost = self.grid.costmap(1.0, inscribed_radius=0.5)
+        self.assertEqual(cost[5, 5], roslibpy2numpy.navigation.LETHAL_OBSTACLE)
+        self.assertEqual(cost[5, 6], roslibpy2numpy.navigation.INSCRIBED_INFLATED_OBSTACLE)
+        self.assertTrue(0 < cost[5, 7] < roslibpy2numpy.navigation.INSCRIBED_INFLATED_OBSTACLE)
+        self.assertEqual(cost[0, 0], roslibpy2numpy.navigation.FREE_SPACE)
+        self.assertEqual(cost[0, 9], roslibpy2numpy.navigation.NO_INFORMATION)
+        self.assertEqual(self.grid.inflate(0.5).sum(), 5)
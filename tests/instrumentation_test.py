@@ -0,0 +1,48 @@
+import base64
+import unittest
+import numpy as np
+import roslibpy2numpy
+from roslibpy2numpy import instrumentation
+
+
+class TestInstrumentation(unittest.TestCase):
+    def setUp(self):
+        instrumentation.reset()
+        self.msg = {
+            'encoding': 'rgb8',
+            'is_bigendian': 0,
+            'height': 2,
+            'width': 3,
+            'data': base64.b64encode(np.arange(18, dtype=np.uint8).tobytes()).decode('ascii')
+        }
+
+    def tearDown(self):
+        instrumentation.disable()
+        instrumentation.reset()
+
+    def test_disabled_records_nothing(self):
+        roslibpy2numpy.raw_image_to_numpy(self.msg)
+        self.assertEqual(instrumentation.snapshot(), {})
+
+    def test_snapshot(self):
+        instrumentation.enable()
+        roslibpy2numpy.raw_image_to_numpy(self.msg)
+        roslibpy2numpy.raw_image_to_numpy(self.msg)
+        stats = instrumentation.snapshot()['raw_image_to_numpy']
+        self.assertEqual(stats['calls'], 2)
+        self.assertEqual(stats['bytes_in'], 2 * len(self.msg['data']))
+        self.assertEqual(stats['bytes_out'], 2 * 18)
+        # the base64 decode and the cvtColor each copy the image
+        self.assertEqual(stats['copies'], 4)
+        self.assertEqual(set(stats['stages']), {'total', 'payload', 'frombuffer', 'cvtColor'})
+        self.assertEqual(stats['stages']['payload']['count'], 2)
+        self.assertEqual(sum(stats['stages']['total']['buckets']), 2)
+
+    def test_prometheus_text(self):
+        instrumentation.enable()
+        roslibpy2numpy.geometry.quat_to_numpy({'x': 0.0, 'y': 0.0, 'z': 0.0, 'w': 1.0})
+        text = instrumentation.prometheus_text()
+        self.assertIn('roslibpy2numpy_calls_total{converter="quat_to_numpy"} 1', text)
+        self.assertIn('roslibpy2numpy_stage_seconds_bucket{converter="quat_to_numpy",stage="total",le="+Inf"} 1',
+                      text)
+        self.assertIn('roslibpy2numpy_stage_seconds_count{converter="quat_to_numpy",stage="total"} 1', text)
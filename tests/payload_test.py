@@ -0,0 +1,44 @@
+import types
+import unittest
+import numpy as np
+import roslibpy2numpy
+
+
+class TestBinaryPayloads(unittest.TestCase):
+    def test_image_round_trip(self):
+        arr = np.arange(24, dtype=np.uint8).reshape(2, 4, 3)
+        for as_bytes in (False, True):
+            msg = roslibpy2numpy.image.numpy_to_image_raw(arr, as_bytes=as_bytes)
+            self.assertIsInstance(msg['data'], bytes if as_bytes else str)
+            msg['is_bigendian'] = 0
+            np.testing.assert_array_equal(roslibpy2numpy.image.raw_image_to_numpy(msg), arr)
+
+    def test_raw_image_zero_copy(self):
+        buf = bytearray(np.arange(6, dtype=np.uint16).tobytes())
+        msg = {'encoding': 'mono16', 'is_bigendian': 0, 'height': 2, 'width': 3, 'data': memoryview(buf)}
+        image = roslibpy2numpy.image.raw_image_to_numpy(msg)
+        buf[0] = 42
+        self.assertEqual(image[0, 0], 42)
+
+    def test_compressed_image(self):
+        encoded = np.frombuffer(b'\x89PNG', dtype=np.uint8)
+        msg = roslibpy2numpy.image.numpy_to_compressed_image(encoded, encoding='png', as_bytes=True)
+        self.assertEqual(msg['data'], b'\x89PNG')
+
+    def test_occupancy_grid(self):
+        arr = np.array([[0, 100], [-1, 0]], dtype=np.int8)
+        msg = roslibpy2numpy.navigation.numpy_to_occupancy_grid(arr, as_bytes=True)
+        self.assertIsInstance(msg['data'], bytes)
+        grid = roslibpy2numpy.navigation.occupancygrid_to_numpy(msg)
+        np.testing.assert_array_equal(grid.data, arr)
+        self.assertTrue(grid.mask[1, 0])
+
+    def test_pointcloud2(self):
+        cloud = np.zeros(3, dtype=[('x', np.float32), ('y', np.float32), ('z', np.float32)])
+        cloud['x'] = [1, 2, 3]
+        msg = roslibpy2numpy.point_cloud2.array_to_pointcloud2(cloud, as_bytes=True)
+        self.assertIsInstance(msg['data'], bytes)
+        decoded = roslibpy2numpy.point_cloud2.pointcloud2_to_array(types.SimpleNamespace(
+            fields=msg['fields'], point_step=msg['point_step'], height=msg['height'], width=msg['width'],
+            data=msg['data']))
+        np.testing.assert_array_equal(decoded['x'], [1, 2, 3])
@@ -0,0 +1,77 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+import roslibpy2numpy
+
+
+class TestRecording(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, 'stream')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_record_and_replay_arrays(self):
+        dtype = np.dtype([('x', '<f4'), ('pad', 'u1'), ('y', '<f4'), ('z', '<f4')])
+        frames = []
+        for n in (2, 5, 0, 3):
+            frame = np.zeros(n, dtype)
+            frame['x'] = np.arange(n)
+            frame['z'] = -np.arange(n)
+            frames.append(frame)
+        # field subset views keep the padded layout, like pointcloud2_to_array
+        frames = [f[['x', 'y', 'z']] for f in frames]
+        with roslibpy2numpy.recording.StreamRecorder(self.path, chunk_size=32) as recorder:
+            for i, frame in enumerate(frames):
+                recorder.append({'sec': i, 'nanosec': 500000000}, frame)
+
+        reader = roslibpy2numpy.recording.StreamReader(self.path)
+        self.assertEqual(len(reader), 4)
+        for frame, replayed in zip(frames, reader):
+            self.assertEqual(replayed.dtype, frame.dtype)
+            np.testing.assert_array_equal(replayed, frame)
+        self.assertEqual(reader.nearest(2.4), 2)
+        self.assertEqual(list(reader.time_range(1.0, 3.0)), [1, 2])
+
+    def test_record_and_replay_dicts(self):
+        with roslibpy2numpy.recording.StreamRecorder(self.path) as recorder:
+            for i in range(3):
+                grid = np.ma.array(np.full((2, 2), i, np.int8), mask=[[True, False], [False, False]], fill_value=0)
+                recorder.append(float(i), dict(position=np.arange(13.0) + i, grid=grid))
+
+        reader = roslibpy2numpy.recording.StreamReader(self.path)
+        frame = reader[-1]
+        np.testing.assert_array_equal(frame['position'], np.arange(13.0) + 2)
+        self.assertTrue(frame['grid'].mask[0, 0])
+        self.assertEqual(frame['grid'].fill_value, 0)
+        self.assertEqual(frame['grid'].filled()[0, 0], 0)
+        self.assertEqual(frame['grid'][1, 1], 2)
+        stamps = [stamp for stamp, _ in reader.read_range(0.5, 10.0)]
+        self.assertEqual(stamps, [1.0, 2.0])
+
+    def test_decreasing_stamp(self):
+        with roslibpy2numpy.recording.StreamRecorder(self.path) as recorder:
+            recorder.append(1.0, np.zeros(3))
+            with self.assertRaises(ValueError):
+                recorder.append(0.5, np.zeros(3))
+
+    def test_empty_recording(self):
+        roslibpy2numpy.recording.StreamRecorder(self.path).close()
+        reader = roslibpy2numpy.recording.StreamReader(self.path)
+        self.assertEqual(len(reader), 0)
+        self.assertEqual(list(reader.read_range(0.0, 10.0)), [])
+
+    def test_rejected_frame_is_not_written(self):
+        with roslibpy2numpy.recording.StreamRecorder(self.path) as recorder:
+            recorder.append(0.0, {'a': np.array([0.0]), 'b': np.array([0.0])})
+            with self.assertRaises(TypeError):
+                recorder.append(1.0, {'a': np.array([1.0]), 'b': np.array([1])})
+            recorder.append(2.0, {'a': np.array([2.0]), 'b': np.array([2.0])})
+
+        reader = roslibpy2numpy.recording.StreamReader(self.path)
+        self.assertEqual(len(reader), 2)
+        self.assertEqual(reader.stamps[1], 2.0)
+        np.testing.assert_array_equal(reader[1]['a'], [2.0])
+        np.testing.assert_array_equal(reader[1]['b'], [2.0])
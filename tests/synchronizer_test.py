@@ -0,0 +1,66 @@
+import unittest
+import roslibpy2numpy
+
+
+def stamped(sec, value):
+    return {'header': {'stamp': {'sec': sec, 'nanosec': 0}}, 'value': value}
+
+
+class TestApproximateTimeSynchronizer(unittest.TestCase):
+    def setUp(self):
+        self.converted = []
+
+        def convert(msg):
+            self.converted.append(msg['value'])
+            return msg['value']
+
+        self.sync = roslibpy2numpy.synchronizer.ApproximateTimeSynchronizer(
+            [convert, convert], queue_size=3, slop=0.5)
+        self.matches = []
+        self.sync.register_callback(lambda a, b: self.matches.append((a, b)))
+
+    def test_matches_within_slop(self):
+        self.assertIsNone(self.sync.add(0, stamped(1, 'a1')))
+        self.assertIsNone(self.sync.add(0, stamped(2, 'a2')))
+        self.assertEqual(self.sync.add(1, stamped(2, 'b2')), ('a2', 'b2'))
+        self.assertEqual(self.matches, [('a2', 'b2')])
+        # a1 was dropped without being converted
+        self.assertEqual(self.converted, ['a2', 'b2'])
+        self.assertIsNone(self.sync.add(1, stamped(1, 'b1')))
+
+    def test_no_match_outside_slop(self):
+        self.sync.add(0, stamped(1, 'a1'))
+        self.assertIsNone(self.sync.add(1, stamped(3, 'b3')))
+        self.assertEqual(self.converted, [])
+
+    def test_bounded_queues(self):
+        for sec in range(10):
+            self.sync.add(0, stamped(sec, 'a{}'.format(sec)))
+        self.assertIsNone(self.sync.add(1, stamped(0, 'b0')))
+        self.assertEqual(self.sync.add(1, stamped(9, 'b9')), ('a9', 'b9'))
+
+    def test_does_not_miss_sets(self):
+        sync = roslibpy2numpy.synchronizer.ApproximateTimeSynchronizer(
+            [None, None, None], slop=0.1, stamp_getter=lambda msg: msg)
+        self.assertIsNone(sync.add(0, 1.0))
+        self.assertIsNone(sync.add(1, 1.05))
+        self.assertIsNone(sync.add(1, 1.12))
+        # a later message on topic 0 could still tighten the set, so it waits for one
+        self.assertIsNone(sync.add(2, 1.1))
+        self.assertEqual(sync.add(0, 1.2), (1.0, 1.05, 1.1))
+
+    def test_waits_for_closer_match(self):
+        sync = roslibpy2numpy.synchronizer.ApproximateTimeSynchronizer(
+            [None, None], slop=0.1, stamp_getter=lambda msg: msg)
+        self.assertIsNone(sync.add(0, 1.0))
+        self.assertIsNone(sync.add(1, 1.09))
+        self.assertEqual(sync.add(1, 1.0), (1.0, 1.0))
+
+    def test_waits_for_pivot_topic(self):
+        sync = roslibpy2numpy.synchronizer.ApproximateTimeSynchronizer(
+            [None, None], slop=0.1, stamp_getter=lambda msg: msg)
+        self.assertIsNone(sync.add(0, 0.0))
+        self.assertIsNone(sync.add(1, 0.08))
+        # a newer message on another topic does not settle the set
+        self.assertIsNone(sync.add(1, 0.5))
+        self.assertEqual(sync.add(0, 0.08), (0.08, 0.08))
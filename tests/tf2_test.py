@@ -0,0 +1,72 @@
+import unittest
+import numpy as np
+import roslibpy2numpy
+
+
+def transform_stamped(parent, child, sec, translation, rotation):
+    return {
+        'header': {'frame_id': parent, 'stamp': {'sec': sec, 'nanosec': 0}},
+        'child_frame_id': child,
+        'transform': {
+            'translation': dict(zip('xyz', translation)),
+            'rotation': dict(zip('xyzw', rotation))
+        }
+    }
+
+
+class TestTransformBuffer(unittest.TestCase):
+    def setUp(self):
+        half = np.sqrt(0.5)
+        self.buffer = roslibpy2numpy.tf2.TransformBuffer()
+        self.buffer.ingest({'transforms': [
+            transform_stamped('map', 'odom', 0, (1.0, 0.0, 0.0), (0.0, 0.0, 0.0, 1.0)),
+            transform_stamped('map', 'odom', 10, (3.0, 0.0, 0.0), (0.0, 0.0, 0.0, 1.0)),
+            transform_stamped('odom', 'base_link', 0, (0.0, 0.0, 0.0), (0.0, 0.0, 0.0, 1.0)),
+            transform_stamped('odom', 'base_link', 10, (0.0, 0.0, 0.0), (0.0, 0.0, half, half)),
+        ]})
+        self.buffer.ingest({'transforms': [
+            transform_stamped('base_link', 'laser', 0, (0.0, 0.0, 1.0), (0.0, 0.0, 0.0, 1.0)),
+        ]}, static=True)
+
+    def test_lookup_interpolates_chain(self):
+        mat = self.buffer.lookup('map', 'laser', {'sec': 5, 'nanosec': 0})
+        # halfway: 45 degrees about z and translated by 2 along x
+        c = np.cos(np.pi / 4)
+        expected = np.array([[c, -c, 0, 2], [c, c, 0, 0], [0, 0, 1, 1], [0, 0, 0, 1]])
+        np.testing.assert_allclose(mat, expected, atol=1e-12)
+
+    def test_lookup_batched_and_inverse(self):
+        stamps = np.array([0.0, 5.0, 10.0])
+        forward = self.buffer.lookup('map', 'laser', stamps)
+        backward = self.buffer.lookup('laser', 'map', stamps)
+        self.assertEqual(forward.shape, (3, 4, 4))
+        np.testing.assert_allclose(np.matmul(forward, backward), np.broadcast_to(np.eye(4), (3, 4, 4)), atol=1e-12)
+
+    def test_transform_points(self):
+        points = np.array([[1.0, 0.0, 0.0], [0.0, 0.0, 0.0]])
+        transformed = self.buffer.transform_points(points, 'map', 'laser', 10.0)
+        np.testing.assert_allclose(transformed, [[3.0, 1.0, 1.0], [3.0, 0.0, 1.0]], atol=1e-12)
+
+    def test_extrapolation(self):
+        with self.assertRaises(ValueError):
+            self.buffer.lookup('map', 'base_link', 11.0)
+        self.assertFalse(self.buffer.can_transform('map', 'unknown'))
+
+    def test_latest_common_time(self):
+        buffer = roslibpy2numpy.tf2.TransformBuffer()
+        buffer.ingest({'transforms': [
+            transform_stamped('a', 'b', 0, (0.0, 0.0, 0.0), (0.0, 0.0, 0.0, 1.0)),
+            transform_stamped('a', 'b', 1, (1.0, 0.0, 0.0), (0.0, 0.0, 0.0, 1.0)),
+            transform_stamped('b', 'c', 0, (0.0, 0.0, 0.0), (0.0, 0.0, 0.0, 1.0)),
+            transform_stamped('b', 'c', 2, (0.0, 2.0, 0.0), (0.0, 0.0, 0.0, 1.0)),
+        ]})
+        # both edges are sampled at t=1, the newest time a -> b has data for
+        np.testing.assert_allclose(buffer.lookup('a', 'c')[:3, 3], [1.0, 1.0, 0.0])
+        np.testing.assert_allclose(buffer.lookup('a', 'c'), buffer.lookup('a', 'c', 1.0))
+
+    def test_static_flag_follows_latest_message(self):
+        self.buffer.ingest({'transforms': [
+            transform_stamped('odom', 'base_link', 20, (5.0, 0.0, 0.0), (0.0, 0.0, 0.0, 1.0)),
+        ]}, static=True)
+        # the edge is static now, so any stamp resolves to its single sample
+        np.testing.assert_allclose(self.buffer.lookup('odom', 'base_link', 5.0)[:3, 3], [5.0, 0.0, 0.0])